@@ -178,8 +178,9 @@ def relabel_by_proximity(clusters):
         mapping[id_new] = i
         id_old = id_new
 
-    labels = clusters["labels"]
-    clusters["labels"] = np.array([mapping[label] for label in labels])
+    lookup = np.zeros(clusters["n_clusters"], dtype=int)
+    lookup[list(mapping.keys())] = list(mapping.values())
+    clusters["labels"] = lookup[clusters["labels"]]
     clusters["centroids"] = clusters["centroids"][list(mapping.keys())]
 
     return clusters
@@ -201,12 +202,11 @@ def compute_distribution_distances(clusters=None, data=None, slices=None):
     if clusters is not None:
         # compute discrete measures supported on cluster centroids
         labels = clusters["labels"]
-        labels = [labels[s[i] : s[i + 1]] + 1 for i in range(len(s) - 1)]
+        labels = [labels[s[i] : s[i + 1]] for i in range(len(s) - 1)]
         nc, nl = clusters["n_clusters"], len(labels)
         bins_dataset = []
         for l_ in labels:  # loop over datasets
-            bins = [(l_ == i + 1).sum() for i in range(nc)]  # loop over clusters
-            bins = np.array(bins)
+            bins = np.bincount(l_, minlength=nc)
             bins_dataset.append(bins / bins.sum())
 
         cdists = pairwise_distances(clusters["centroids"])
@@ -430,12 +430,11 @@ def compute_connection_laplacian(data, R, normalization="rw"):
     L = compute_laplacian(data, normalization=None)  # .to_sparse()
 
     # rearrange into block form (kron(L, ones(d,d)))
-    edge_index = utils.expand_edge_index(L.indices(), dim=d)
-    L = torch.sparse_coo_tensor(edge_index, L.values().repeat_interleave(d * d))
+    L = utils.tile_tensor(L, d)
 
     # unnormalised connection laplacian
     # Lc(i,j) = L(i,j)*R(i,j) if (i,j)=\in E else 0
-    Lc = L * R
+    Lc = (L * R).coalesce()
 
     # normalize
     edge_index, edge_weight = PyGu.remove_self_loops(data.edge_index, data.edge_weight)
@@ -449,7 +448,11 @@ def compute_connection_laplacian(data, R, normalization="rw"):
         deg_inv = 1.0 / deg
         deg_inv.masked_fill_(deg_inv == float("inf"), 0)
         deg_inv = deg_inv.repeat_interleave(d, dim=0)
-        Lc = torch.diag(deg_inv).to_sparse() @ Lc
+
+        # D^-1 @ Lc, scaling the rows of Lc without forming the dense diagonal matrix
+        Lc = torch.sparse_coo_tensor(
+            Lc.indices(), Lc.values() * deg_inv[Lc.indices()[0]], Lc.size()
+        )
 
     return Lc.coalesce()
 
@@ -559,7 +562,8 @@ def compute_eigendecomposition(A, k=None, eps=1e-8):
 
     Args:
         A: square matrix A
-        k: number of eigenvectors
+        k: number of eigenvectors with the smallest eigenvalues. A must then be sparse and
+            symmetric, e.g. a Laplacian with normalization="sym" or None
         eps: small error term
 
     Returns:
@@ -574,6 +578,8 @@ def compute_eigendecomposition(A, k=None, eps=1e-8):
     else:
         indices, values, size = A.indices(), A.values(), A.size()
         A = sp.coo_array((values, (indices[0], indices[1])), shape=size)
+        if abs(A - A.T).max() > 1e-6 * abs(A).max():
+            raise ValueError("Truncated eigendecomposition needs a symmetric matrix!")
 
     failcount = 0
     while True:
@@ -581,7 +587,8 @@ def compute_eigendecomposition(A, k=None, eps=1e-8):
             if k is None:
                 evals, evecs = torch.linalg.eigh(A)  # pylint: disable=not-callable
             else:
-                evals, evecs = sp.linalg.eigsh(A, k=k, which="SM")
+                # shift-invert around a point just below the (non-negative) spectrum
+                evals, evecs = sp.linalg.eigsh(A, k=k, sigma=-1e-2, which="LM")
                 evals, evecs = torch.tensor(evals), torch.tensor(evecs)
 
             evals = torch.clamp(evals, min=0.0)
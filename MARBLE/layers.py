@@ -1,37 +1,111 @@
 """Layer module."""
 
+import math
+
 import torch
 from torch import nn
 from torch_geometric.nn.conv import MessagePassing
+from torch_sparse import cat
 
+from MARBLE import geometry as g
 from MARBLE import smoothing as s
 
 
 class Diffusion(nn.Module):
     """Diffusion with learned t."""
 
-    def __init__(self, tau0=0.0):
-        """initialise."""
+    def __init__(self, tau0=0.0, k=None, bf16=False):
+        """initialise.
+
+        Args:
+            tau0: initial diffusion time
+            k: number of eigenpairs with smallest eigenvalues to keep when the Laplacian
+                is passed as a matrix to the spectral method. If None, all are kept.
+                Truncating discards the high-frequency components of the signal and needs a
+                symmetric Laplacian, e.g. compute_laplacian(data, normalization="sym").
+            bf16: apply spectral diffusion with bfloat16 eigenvectors (eigendecomposition
+                is still done in full precision). Worthwhile on GPUs with bf16 tensor cores.
+
+        k and bf16 apply to this layer only, net builds its Diffusion layer with the defaults.
+        """
         super().__init__()
 
         self.diffusion_time = nn.Parameter(torch.tensor(float(tau0)))
-
-    def forward(self, x, L, Lc=None, method="spectral"):
-        """Forward."""
-        if method == "spectral":
+        self.clamp_diffusion_time()
+        self.k = k
+        self.bf16 = bf16
+
+        # eigendecompositions of the last Laplacian (L) and connection Laplacian (Lc) seen
+        self.register_buffer("evals", None, persistent=False)
+        self.register_buffer("evecs", None, persistent=False)
+        self.register_buffer("evecs_bf16", None, persistent=False)
+        self.register_buffer("evals_c", None, persistent=False)
+        self.register_buffer("evecs_c", None, persistent=False)
+        self.register_buffer("evecs_bf16_c", None, persistent=False)
+        self._L, self._L_c = None, None
+
+        # last Laplacians checked for the Chebyshev method
+        self._L_cheb, self._L_c_cheb = None, None
+
+    def eigendecomposition(self, L, suffix=""):
+        """Eigenvalues and eigenvectors of L, only recomputed when a new Laplacian is passed.
+
+        Args:
+            L: Laplacian matrix, or a precomputed pair of eigenvalues and eigenvectors
+            suffix: "" for the scalar Laplacian, "_c" for the connection Laplacian
+        """
+        if isinstance(L, (list, tuple)):
             assert len(L) == 2, "L must be a matrix or a pair of eigenvalues and eigenvectors"
+            if not self.bf16:
+                return L
+
+        if getattr(self, f"_L{suffix}") is not L:
+            if isinstance(L, (list, tuple)):
+                evals, evecs = L
+            else:
+                evals, evecs = g.compute_eigendecomposition(L, k=self.k)
+            setattr(self, f"evals{suffix}", evals)
+            setattr(self, f"evecs{suffix}", evecs)
+            if self.bf16:
+                setattr(self, f"evecs_bf16{suffix}", evecs.to(torch.bfloat16))
+            setattr(self, f"_L{suffix}", L)
+
+        evecs = getattr(self, f"evecs_bf16{suffix}" if self.bf16 else f"evecs{suffix}")
+
+        return getattr(self, f"evals{suffix}"), evecs
+
+    @torch.no_grad()
+    def clamp_diffusion_time(self):
+        """Make sure the diffusion time is positive. Call after each optimiser step."""
+        self.diffusion_time.clamp_(min=1e-8)
+
+    def forward(self, x, L, Lc=None, method="spectral", order=None):
+        """Forward. order is the degree of the Chebyshev polynomial for method="chebyshev",
+        chosen once per call from the diffusion time if None."""
+        if method == "spectral":
+            L = self.eigendecomposition(L)
+            if Lc is not None:
+                Lc = self.eigendecomposition(Lc, suffix="_c")
+
+        if method == "chebyshev":
+            if self._L_cheb is not L:
+                s.check_chebyshev_laplacian(L)
+                self._L_cheb = L
+            if Lc is not None and self._L_c_cheb is not Lc:
+                s.check_chebyshev_laplacian(Lc)
+                self._L_c_cheb = Lc
 
-        # making sure diffusion times are positive
-        with torch.no_grad():
-            self.diffusion_time.data = torch.clamp(self.diffusion_time, min=1e-8)
+        # the parameter is kept positive by clamp_diffusion_time() after each optimiser
+        # step, this only guards against values set from outside
+        t = torch.clamp(self.diffusion_time, min=1e-8)
 
-        t = self.diffusion_time
+        if method == "chebyshev" and order is None:
+            order = s.chebyshev_order(t)
 
         if Lc is not None:
-            out = s.vector_diffusion(x, t, Lc, L=L, method=method, normalise=True)
+            out = s.vector_diffusion(x, t, Lc, L=L, method=method, normalise=True, order=order)
         else:
-            out = [s.scalar_diffusion(x_, t, method, L) for x_ in x.T]
-            out = torch.cat(out, axis=1)
+            out = s.scalar_diffusion(x, t, method, L, order=order)
 
         return out
 
@@ -44,16 +118,16 @@ class AnisoConv(MessagePassing):
         super().__init__(aggr="add", **kwargs)
 
     def forward(self, x, kernels):
-        """Forward."""
-        out = []
-        for K in kernels:
-            out.append(self.propagate(K, x=x))
+        """Forward. The kernels are stacked row-wise so that all directional
+        derivatives are obtained from a single sparse matrix multiplication."""
+        n_kernels, dim = len(kernels), x.shape[1]
+
+        out = self.propagate(cat(kernels, dim=0), x=x)
 
         # [[dx1/du, dx2/du], [dx1/dv, dx2/dv]] -> [dx1/du, dx1/dv, dx2/du, dx2/dv]
-        out = torch.stack(out, axis=2)
-        out = out.view(out.shape[0], -1)
+        out = out.view(n_kernels, -1, dim).permute(1, 2, 0)
 
-        return out
+        return out.reshape(out.shape[0], -1)
 
     def message_and_aggregate(self, K_t, x):
         """Message passing step. If K_t is a txs matrix (s sources, t targets),
@@ -63,14 +137,10 @@ class AnisoConv(MessagePassing):
         [dx1/du, x1/dv, ..., dx2/du, dx2/dv, ...].
         """
         n, dim = x.shape
+        assert (n * dim) % K_t.size(1) == 0, "Kernel size does not match the features!"
+        n_ch = n * dim // K_t.size(1)
 
-        if (K_t.size(dim=1) % n * dim) == 0:
-            n_ch = torch.div(n * dim, K_t.size(dim=1), rounding_mode="floor")
-            x = x.view(-1, n_ch)
-
-        x = K_t.matmul(x, reduce=self.aggr)
-
-        return x.view(-1, dim)
+        return K_t.matmul(x.reshape(-1, n_ch), reduce=self.aggr).reshape(-1, dim)
 
 
 class InnerProductFeatures(nn.Module):
@@ -85,16 +155,31 @@ class InnerProductFeatures(nn.Module):
 
         self.C, self.D = C, D
 
-        self.O_mat = nn.ModuleList()
-        for _ in range(C):
-            self.O_mat.append(nn.Linear(D, D, bias=True))
+        # one DxD linear map (weight and bias) per channel, stacked
+        self.O_mat = nn.Parameter(torch.empty(C, D, D))
+        self.O_bias = nn.Parameter(torch.empty(C, D))
 
         self.reset_parameters()
 
     def reset_parameters(self):
         """Reset parameters."""
-        for i, _ in enumerate(self.O_mat):
-            self.O_mat[i].weight.data = torch.eye(self.D)
+        self.O_mat.data = torch.eye(self.D).repeat(self.C, 1, 1)
+        bound = 1 / math.sqrt(self.D)
+        nn.init.uniform_(self.O_bias, -bound, bound)
+
+    def _load_from_state_dict(
+        self, state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs
+    ):
+        """Convert models saved with one nn.Linear per channel to stacked parameters."""
+        if f"{prefix}O_mat.0.weight" in state_dict:
+            weight = [state_dict.pop(f"{prefix}O_mat.{j}.weight") for j in range(self.C)]
+            bias = [state_dict.pop(f"{prefix}O_mat.{j}.bias") for j in range(self.C)]
+            state_dict[f"{prefix}O_mat"] = torch.stack(weight)
+            state_dict[f"{prefix}O_bias"] = torch.stack(bias)
+
+        super()._load_from_state_dict(
+            state_dict, prefix, local_metadata, strict, missing_keys, unexpected_keys, error_msgs
+        )
 
     def forward(self, x):
         """Forward."""
@@ -121,8 +206,7 @@ class InnerProductFeatures(nn.Module):
         assert x.shape[2] == self.C, "Number of channels is incorrect!"
 
         # O_ij@x_j
-        Ox = [self.O_mat[j](x[..., j]) for j in range(self.C)]
-        Ox = torch.stack(Ox, dim=2)
+        Ox = torch.einsum("cij,bjc->bic", self.O_mat, x) + self.O_bias.t()
 
         # \sum_j x_i^T@O_ij@x_j
         xOx = torch.einsum("bki,bkj->bi", x, Ox)
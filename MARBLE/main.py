@@ -46,6 +46,7 @@ class net(nn.Module):
         emb_norm: normalise MLP output to unit length (default=False)
         batch_norm: batch normalisation (default=True)
         seed: seed for reproducibility
+        compile: compile the MLP with torch.compile, requires torch>=2.2 (default=False)
     """
 
     def __init__(self, data, loadpath=None, params=None, verbose=True):
@@ -146,6 +147,7 @@ class net(nn.Module):
             "seed",
             "include_positions",
             "include_self",
+            "compile",
         ]
 
         for p in pars:
@@ -202,6 +204,13 @@ class net(nn.Module):
             norm=self.params["batch_norm"],
         )
 
+        if self.params["compile"]:
+            if not hasattr(nn.Module, "compile"):
+                raise RuntimeError("compile=True requires torch>=2.2 (nn.Module.compile)")
+            # only the MLP is compiled, AnisoConv's sparse matmuls are not lowered by inductor.
+            # Batch sizes vary (last minibatch, full graph in transform), so shapes are dynamic
+            self.enc.compile(dynamic=True)
+
     def forward(self, data, n_id, adjs=None):
         """Forward pass.
         Messages are passed to a set target nodes (current batch) from source
@@ -327,6 +336,7 @@ class net(nn.Module):
                 optimizer.zero_grad()  # zero gradients, otherwise accumulates
                 loss.backward()  # backprop
                 optimizer.step()
+                self.diffusion.clamp_diffusion_time()
 
         self.eval()
 
@@ -417,7 +427,13 @@ class net(nn.Module):
         )
         self._epoch = checkpoint["epoch"]
         self.load_state_dict(checkpoint["model_state_dict"])
-        self.optimizer_state_dict = checkpoint["optimizer_state_dict"]
+
+        # models saved with one nn.Linear per channel in InnerProductFeatures have an optimizer
+        # state with a different number of parameters, which cannot be restored
+        if any(k.endswith("O_mat.0.weight") for k in checkpoint["model_state_dict"]):
+            warnings.warn("Optimizer state of an older model version is discarded.")
+        else:
+            self.optimizer_state_dict = checkpoint["optimizer_state_dict"]
         if hasattr(self, "losses"):
             self.losses = checkpoint["losses"]
 
@@ -384,7 +384,7 @@ def neighbourhoods(
 
             if not norm:  # set colors based on global values
                 c, _ = set_colors(c)
-                c = [c[i] for i in node_ids] if isinstance(c, (list, np.ndarray)) else c
+                c = np.asarray(c)[node_ids] if isinstance(c, (list, np.ndarray)) else c
                 signal = signal[node_ids]
             else:  # first extract subgraph, then compute normalized colors
                 signal = signal[node_ids]
@@ -734,7 +734,7 @@ def set_colors(color, cmap="coolwarm"):
     if isinstance(color[0], (float, np.floating)):
         cmap = sns.color_palette(cmap, as_cmap=True)
         norm = plt.cm.colors.Normalize(0, np.max(np.abs(color)))
-        colors = [cmap(norm(np.array(c).flatten())) for c in color]
+        colors = cmap(norm(np.asarray(color, dtype=np.float32).flatten()))  # (n x 4) RGBA array
 
     elif isinstance(color[0], (int, np.integer)):
         cmap = sns.color_palette()
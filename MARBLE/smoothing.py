@@ -1,10 +1,28 @@
 """Smoothing module."""
 
+import math
+
 import torch
 
 
-def scalar_diffusion(x, t, method="matrix_exp", par=None):
-    """Scalar diffusion."""
+def scalar_diffusion(x, t, method="matrix_exp", par=None, order=None):
+    """Scalar diffusion of each column of x (nxc) in a single pass.
+
+    Args:
+        x: (nxc) signal
+        t: diffusion time
+        method: "matrix_exp", "spectral" or "chebyshev"
+        par: Laplacian for "matrix_exp" and "chebyshev" (dense or sparse), a pair of
+            eigenvalues and eigenvectors for "spectral". The spectral transforms are done in
+            the dtype of the eigenvectors and the result is cast back to the dtype of x.
+        order: degree of the Chebyshev polynomial for "chebyshev". If None, it is chosen
+            from t by chebyshev_order(), which needs t on the host. Pass it to avoid the sync.
+
+    The "chebyshev" method approximates exp(-tL) by a polynomial in L - I, which is only
+    valid if the spectrum of L lies in [0, 2]. This holds for Laplacians normalised with
+    "rw" or "sym", or more generally with all degrees at most 1. It is not checked here,
+    use check_chebyshev_laplacian() once per Laplacian.
+    """
     if len(x.shape) == 1:
         x = x.unsqueeze(1)
 
@@ -20,21 +38,74 @@ def scalar_diffusion(x, t, method="matrix_exp", par=None):
             eigenvalues, eigenvectors!"
         evals, evecs = par
 
-        # Transform to spectral
-        x_spec = torch.mm(evecs.T, x)
+        # Transform to spectral, in the precision of the eigenvectors (e.g. bfloat16)
+        x_spec = torch.mm(evecs.T, x.to(evecs.dtype))
 
         # Diffuse
         diffusion_coefs = torch.exp(-evals.unsqueeze(-1) * t.unsqueeze(0))
-        x_diffuse_spec = diffusion_coefs * x_spec
+        x_diffuse_spec = diffusion_coefs.to(evecs.dtype) * x_spec
 
         # Transform back to per-vertex
-        return evecs.mm(x_diffuse_spec)
+        return evecs.mm(x_diffuse_spec).to(x.dtype)
+
+    if method == "chebyshev":
+        if order is None:
+            order = chebyshev_order(t)
+        assert order >= 1, "Chebyshev approximation needs order >= 1!"
+        mm = torch.sparse.mm if par.is_sparse else torch.mm
+        coefs = _chebyshev_coefficients(t, order)
+
+        # exp(-tL)x = sum_k c_k T_k(L - I)x, where the spectrum of L - I is in [-1, 1]
+        # for random-walk normalised Laplacians, using T_k+1 = 2(L - I)T_k - T_k-1
+        T_prev, T = x, mm(par, x) - x
+        out = coefs[0] * T_prev + coefs[1] * T
+        for c in coefs[2:]:
+            T_prev, T = T, 2 * (mm(par, T) - T) - T_prev
+            out = out + c * T
+
+        return out
 
     raise NotImplementedError
 
 
-def vector_diffusion(x, t, Lc, L=None, method="spectral", normalise=True):
-    """Vector diffusion."""
+def chebyshev_order(t):
+    """Degree of the Chebyshev polynomial keeping the error of exp(-tL) below 1e-7."""
+    return max(10, math.ceil(6 * math.sqrt(float(t))))
+
+
+def check_chebyshev_laplacian(L):
+    """Check that the spectrum of L is in [0, 2] through its diagonal, which holds the degrees."""
+    assert (
+        _diagonal(L).max() <= 1 + 1e-6
+    ), "Chebyshev approximation needs a Laplacian normalised with 'rw' or 'sym'!"
+
+
+def _diagonal(A):
+    """Diagonal of a dense or sparse matrix."""
+    if not A.is_sparse:
+        return torch.diagonal(A)
+
+    A = A.coalesce()
+    row, col = A.indices()
+    diag = torch.zeros(A.shape[0], dtype=A.dtype, device=A.device)
+
+    return diag.index_copy(0, row[row == col], A.values()[row == col])
+
+
+def _chebyshev_coefficients(t, order):
+    """Chebyshev coefficients of exp(-t(y + 1)) on [-1, 1] by Chebyshev-Gauss quadrature.
+    Computed in torch so that gradients propagate to the diffusion time."""
+    n = order + 1
+    theta = math.pi * (torch.arange(n, device=t.device) + 0.5) / n
+    f = torch.exp(-t * (torch.cos(theta) + 1))
+    k = torch.arange(n, device=t.device).unsqueeze(1)
+    coefs = 2 / n * (f * torch.cos(k * theta)).sum(1)
+
+    return torch.cat([coefs[:1] / 2, coefs[1:]])
+
+
+def vector_diffusion(x, t, Lc, L=None, method="spectral", normalise=True, order=None):
+    """Vector diffusion. See scalar_diffusion() for the methods and order."""
     n, d = x.shape[0], x.shape[1]
 
     if method == "spectral":
@@ -48,16 +119,19 @@ def vector_diffusion(x, t, Lc, L=None, method="spectral", normalise=True):
     ) == 0, "Data dimension must be an integer multiple of the dimensions \
          of the connection Laplacian!"
 
+    if method == "chebyshev" and order is None:
+        order = chebyshev_order(t)
+
     # vector diffusion with connection Laplacian
     out = x.view(nd, -1)
-    out = scalar_diffusion(out, t, method, Lc)
+    out = scalar_diffusion(out, t, method, Lc, order=order)
     out = out.view(x.shape)
 
     if normalise:
         assert L is not None, "Need Laplacian for normalised diffusion!"
         x_abs = x.norm(dim=-1, p=2, keepdim=True)
-        out_abs = scalar_diffusion(x_abs, t, method, L)
-        ind = scalar_diffusion(torch.ones(x.shape[0], 1).to(x.device), t, method, L)
+        out_abs = scalar_diffusion(x_abs, t, method, L, order=order)
+        ind = scalar_diffusion(torch.ones(x.shape[0], 1).to(x.device), t, method, L, order=order)
         out = out * out_abs / (ind * out.norm(dim=-1, p=2, keepdim=True))
 
     return out
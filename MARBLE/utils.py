@@ -218,19 +218,12 @@ def expand_edge_index(edge_index, dim=1):
     if dim == 1:
         return edge_index
 
-    dev = edge_index.device
-    if dev != "cpu":
-        edge_index = edge_index.to("cpu")
+    # block (i,j) of edge e maps to (e[0]*dim + i, e[1]*dim + j), row-major within the block
+    offset = torch.arange(dim, device=edge_index.device)
+    row = (edge_index[0].view(-1, 1, 1) * dim + offset.view(1, -1, 1)).expand(-1, dim, dim)
+    col = (edge_index[1].view(-1, 1, 1) * dim + offset.view(1, 1, -1)).expand(-1, dim, dim)
 
-    n = edge_index.shape[1]
-    ind = [torch.tensor([i, j]) for i in range(dim) for j in range(dim)]
-    edge_index = [edge_index * dim + i.unsqueeze(1) for i in ind]
-    edge_index = torch.stack(edge_index, dim=2).view(2, n * len(ind))
-
-    if dev != "cpu":
-        edge_index.to(dev)
-
-    return edge_index
+    return torch.stack([row.flatten(), col.flatten()])
 
 
 def tile_tensor(tensor, dim):
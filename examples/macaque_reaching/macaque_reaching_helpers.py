@@ -8,36 +8,24 @@ import matplotlib.pyplot as plt
 
 conditions=['DownLeft','Left','UpLeft','Up','UpRight','Right','DownRight']
 
-def get_vector_array(coords):
+def get_vector_array(coords, axis=0):
     """function for defining the vector features from each array of coordinates"""
-    diff = np.diff(coords, axis=0)
+    diff = np.diff(coords, axis=axis)
     return diff
 
 
 def fit_pca(rates, day, conditions, filter_data=True, pca_n=5):
-    pos = []
-    # loop over each condition on that day
-    for c, cond in enumerate(conditions):
+    # stack the trials of all conditions on that day (trials x channels x time)
+    # go cue at 500ms (500ms / 20ms bin = 250)
+    # only take rates from bin 10 onwards
+    data = np.concatenate([rates[day][cond][:, :, 25:] for cond in conditions])
 
-        # go cue at 500ms (500ms / 20ms bin = 250)
-        # only take rates from bin 10 onwards
-        data = rates[day][cond][:, :, 25:]
+    # smooth all trials over time
+    if filter_data:
+        data = savgol_filter(data, 9, 2)
 
-        # loop over all trials
-        for t in range(data.shape[0]):
-
-            # extract trial
-            trial = data[t, :, :]
-
-            # smooth trial over time
-            if filter_data:
-                trial = savgol_filter(trial, 9, 2)
-
-            # store each trial as time x channels
-            pos.append(trial.T)
-
-    # stacking all trials into a single array (time x channels)
-    pos = np.vstack(pos)
+    # single array (trials*time x channels)
+    pos = data.transpose(0, 2, 1).reshape(-1, data.shape[1])
 
     # fit PCA to all data across all conditions on a given day simultaneously
     pca = PCA(n_components=pca_n)
@@ -47,54 +35,56 @@ def fit_pca(rates, day, conditions, filter_data=True, pca_n=5):
 
 
 def format_data(rates, trial_ids, day, conditions, pca=None, filter_data=True, go_cue=25, stack=True):
-    # create empty list of lists for each condition
-    pos = [[] for u in range(len(conditions))]
-    vel = [[] for u in range(len(conditions))]
-    timepoints = [[] for u in range(len(conditions))]
-    condition_labels = [[] for u in range(len(conditions))]
-    trial_indexes = [[] for u in range(len(conditions))]
-
-    # loop over conditions
-    for c, cond in enumerate(conditions):
-
-        # go cue at 500ms (500ms / 50ms bin = 10)
-        data = rates[day][cond][:, :, go_cue:]
-
-        # loop over all trials
-        for t in range(data.shape[0]):
-
-            # extract trial
-            trial = data[t, :, :]
-
-            # smooth trial over time
-            if filter_data:
-                trial = savgol_filter(trial, 9, 2)
-
-            # apply the transformation to a single trial
-            if pca is not None:
-                trial = pca.transform(trial.T)
-            else:
-                trial = trial.T
-
-            # take all points except last
-            pos[c].append(trial[:-1, :])
-
-            # extract vectors between coordinates
-            vel[c].append(get_vector_array(trial))
-            timepoints[c].append(np.linspace(0, trial.shape[0] - 2, trial.shape[0] - 1))
-            condition_labels[c].append(np.repeat(c, trial.shape[0] - 1))
-
-            # adding trial id info (to match with kinematics decoding later)
-            ind = np.repeat(trial_ids[day][cond][t], trial.shape[0] - 1)
-            trial_indexes[c].append(ind)
+    # stack the trials of all conditions (trials x channels x time)
+    # go cue at 500ms (500ms / 50ms bin = 10)
+    data = [rates[day][cond][:, :, go_cue:] for cond in conditions]
+    n_trials = [len(d) for d in data]
+    data = np.concatenate(data)
+
+    # smooth all trials over time
+    if filter_data:
+        data = savgol_filter(data, 9, 2)
+
+    # trials x time x channels
+    data = data.transpose(0, 2, 1)
+    n_time = data.shape[1]
+
+    # apply the transformation to all trials at once
+    if pca is not None:
+        data = pca.transform(data.reshape(-1, data.shape[2]))
+        data = data.reshape(sum(n_trials), n_time, -1)
+
+    # take all points except last
+    pos = data[:, :-1, :]
+
+    # extract vectors between coordinates
+    vel = get_vector_array(data, axis=1)
+    timepoints = np.tile(np.linspace(0, n_time - 2, n_time - 1), (sum(n_trials), 1))
+    condition_labels = np.repeat(np.arange(len(conditions)), n_trials)
+    condition_labels = np.repeat(condition_labels[:, None], n_time - 1, axis=1)
+
+    # adding trial id info (to match with kinematics decoding later)
+    ind = [np.asarray(trial_ids[day][cond])[:n] for cond, n in zip(conditions, n_trials)]
+    trial_indexes = np.repeat(np.concatenate(ind)[:, None], n_time - 1, axis=1)
+
+    # split back into conditions
+    split = np.cumsum(n_trials)[:-1]
+    pos, vel = np.split(pos, split), np.split(vel, split)
+    timepoints, condition_labels = np.split(timepoints, split), np.split(condition_labels, split)
+    trial_indexes = np.split(trial_indexes, split)
 
     # stack the trials within each condition
     if stack:
-        pos = [np.vstack(u) for u in pos]  # trials x time x channels
-        vel = [np.vstack(u) for u in vel]  # trials x time x channels
-        timepoints = [np.hstack(u) for u in timepoints]
-        condition_labels = [np.hstack(u) for u in condition_labels]
-        trial_indexes = [np.hstack(u) for u in trial_indexes]
+        pos = [u.reshape(-1, u.shape[-1]) for u in pos]  # trials*time x channels
+        vel = [u.reshape(-1, u.shape[-1]) for u in vel]  # trials*time x channels
+        timepoints = [u.flatten() for u in timepoints]
+        condition_labels = [u.flatten() for u in condition_labels]
+        trial_indexes = [u.flatten() for u in trial_indexes]
+    else:
+        pos, vel = [list(u) for u in pos], [list(u) for u in vel]
+        timepoints = [list(u) for u in timepoints]
+        condition_labels = [list(u) for u in condition_labels]
+        trial_indexes = [list(u) for u in trial_indexes]
         
     return pos, vel, timepoints, condition_labels, trial_indexes
 
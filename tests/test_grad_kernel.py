@@ -189,3 +189,25 @@ def test_gauges(plot=False):
         PCM = ax1.get_children()[0]  # get the mappable, the 1st and the 2nd are the x and y axes
         plt.colorbar(PCM, ax=ax1)
         plt.show()
+
+
+def test_grad_kernel_backward():
+    """Test backpropagation through the stacked kernels."""
+    n = 100
+    k = 8
+    alpha = np.pi / 4
+
+    xv, yv = np.meshgrid(np.linspace(-1, 1, int(np.sqrt(n))), np.linspace(-1, 1, int(np.sqrt(n))))
+    x = np.vstack([xv.flatten(), yv.flatten()]).T
+    y = f1(x, alpha)
+
+    data = construct_dataset(x, y, graph_type="cknn", k=k)
+    K = geometry.gradient_op(data.pos, data.edge_index, data.gauges)
+    K = [utils.to_SparseTensor(_K.coalesce().indices(), value=_K.coalesce().values()) for _K in K]
+
+    y = torch.tensor(y, requires_grad=True)
+    AnisoConv()(y, K).sum().backward()
+
+    # d/dy sum_ij (K_u@y + K_v@y)_ij = column sums of K_u + K_v
+    expected = sum(_K.to_dense().sum(0) for _K in K)
+    assert_array_almost_equal(y.grad.numpy()[:, 0], expected.numpy(), decimal=5)
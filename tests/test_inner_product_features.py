@@ -0,0 +1,33 @@
+"""Test inner product features."""
+
+import torch
+from numpy.testing import assert_array_almost_equal
+from torch import nn
+
+from MARBLE.layers import InnerProductFeatures
+
+
+def test_inner_product_features():
+    """Test stacked maps against one nn.Linear per channel, loaded from an old state dict."""
+    C, D, n = 4, 3, 50
+
+    torch.manual_seed(0)
+    O_mat = nn.ModuleList([nn.Linear(D, D, bias=True) for _ in range(C)])
+    x = torch.randn(n, C * D)
+
+    # per-channel maps as computed before the parameters were stacked
+    x_ = x.view(n, -1, D).swapaxes(1, 2)
+    Ox = torch.stack([O_mat[j](x_[..., j]) for j in range(C)], dim=2)
+    expected = torch.tanh(torch.einsum("bki,bkj->bi", x_, Ox))
+
+    layer = InnerProductFeatures(C, D)
+    layer.load_state_dict({f"O_mat.{k}": v for k, v in O_mat.state_dict().items()})
+
+    assert set(layer.state_dict()) == {"O_mat", "O_bias"}
+    assert_array_almost_equal(
+        layer.O_mat.detach().numpy(), torch.stack([O.weight for O in O_mat]).detach().numpy()
+    )
+    assert_array_almost_equal(
+        layer.O_bias.detach().numpy(), torch.stack([O.bias for O in O_mat]).detach().numpy()
+    )
+    assert_array_almost_equal(layer(x).detach().numpy(), expected.detach().numpy(), decimal=5)
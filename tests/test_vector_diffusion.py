@@ -2,6 +2,7 @@
 
 import matplotlib.pyplot as plt
 import numpy as np
+import pytest
 from numpy.testing import assert_array_almost_equal
 
 from MARBLE import construct_dataset
@@ -167,3 +168,119 @@ def test_diffusion_sphere(plot=False):
     if plot:
         plotting.fields(data, alpha=1)
         plt.show()
+
+
+def test_chebyshev_diffusion():
+    """Test Chebyshev approximation of diffusion against the matrix exponential."""
+    x = sphere()
+    y = f2(x)
+
+    data = construct_dataset(
+        x, y, graph_type="radius", k=0.4, frac_geodesic_nb=1.5, var_explained=0.9
+    )
+
+    L = geometry.compute_laplacian(data)
+
+    for tau0 in [1.0, 10.0, 50.0]:
+        diffusion = Diffusion(tau0=tau0)
+        expected = diffusion(data.x, L, method="matrix_exp")
+        out = diffusion(data.x, L, method="chebyshev")
+        assert_array_almost_equal(out.detach().numpy(), expected.detach().numpy(), decimal=4)
+
+    # unnormalised Laplacians can have a spectrum outside [0, 2]
+    with pytest.raises(AssertionError):
+        Diffusion(tau0=1.0)(
+            data.x, geometry.compute_laplacian(data, normalization=None), method="chebyshev"
+        )
+
+
+def test_truncated_eigendecomposition():
+    """Test that truncated eigenpairs agree with the full eigendecomposition."""
+    x = sphere()
+    y = f2(x)
+
+    data = construct_dataset(
+        x, y, graph_type="radius", k=0.4, frac_geodesic_nb=1.5, var_explained=0.9
+    )
+
+    L = geometry.compute_laplacian(data, normalization="sym")
+
+    evals, _ = geometry.compute_eigendecomposition(L)
+    evals_k, evecs_k = geometry.compute_eigendecomposition(L, k=10)
+    assert_array_almost_equal(np.sort(evals_k.numpy()), evals.numpy()[:10], decimal=4)
+
+    residual = L.to_dense() @ evecs_k - evecs_k * evals_k
+    assert_array_almost_equal(residual.numpy(), np.zeros_like(residual.numpy()), decimal=3)
+
+
+def test_diffusion_eigendecomposition_cache(monkeypatch):
+    """Test that the eigendecomposition is only recomputed for a new Laplacian."""
+    x = sphere()
+    y = f2(x)
+
+    data = construct_dataset(
+        x, y, graph_type="radius", k=0.4, frac_geodesic_nb=1.5, var_explained=0.9
+    )
+
+    L = geometry.compute_laplacian(data)
+    evals, evecs = geometry.compute_eigendecomposition(L)
+
+    calls = []
+    compute_eigendecomposition = geometry.compute_eigendecomposition
+
+    def counted_eigendecomposition(*args, **kwargs):
+        calls.append(args[0])
+        return compute_eigendecomposition(*args, **kwargs)
+
+    monkeypatch.setattr(geometry, "compute_eigendecomposition", counted_eigendecomposition)
+
+    diffusion = Diffusion(tau0=1.0)
+    out = diffusion(data.x, L, method="spectral")
+    assert len(calls) == 1
+
+    assert_array_almost_equal(
+        diffusion(data.x, L, method="spectral").detach().numpy(), out.detach().numpy()
+    )
+    assert len(calls) == 1
+
+    expected = diffusion(data.x, (evals, evecs), method="spectral")
+    assert_array_almost_equal(out.detach().numpy(), expected.detach().numpy(), decimal=5)
+    assert len(calls) == 1
+
+    diffusion(data.x, geometry.compute_laplacian(data), method="spectral")
+    assert len(calls) == 2
+
+
+def test_truncated_diffusion():
+    """Test spectral diffusion on a truncated eigendecomposition of the Laplacian."""
+    x = dynamics.sample_2d(512, [[-1, -1], [1, 1]], "random")
+    data = construct_dataset(x, f1(x), graph_type="cknn", k=30)
+
+    # the default random-walk Laplacian is not symmetric
+    with pytest.raises(ValueError):
+        Diffusion(tau0=1.0, k=10)(data.x, geometry.compute_laplacian(data), method="spectral")
+
+    L = geometry.compute_laplacian(data, normalization="sym")
+    evals, evecs = geometry.compute_eigendecomposition(L)
+
+    diffusion = Diffusion(tau0=1.0, k=10)
+    expected = diffusion(data.x, (evals[:10], evecs[:, :10]), method="spectral")
+    out = diffusion(data.x, L, method="spectral")
+    assert_array_almost_equal(out.detach().numpy(), expected.detach().numpy(), decimal=4)
+
+
+def test_bf16_diffusion():
+    """Test spectral diffusion with bfloat16 eigenvectors against full precision."""
+    x = dynamics.sample_2d(256, [[-1, -1], [1, 1]], "random")
+    data = construct_dataset(x, f1(x), graph_type="cknn", k=15)
+
+    gauges, _ = geometry.compute_gauges(data)
+    R = geometry.compute_connections(data, gauges)
+    L = geometry.compute_laplacian(data)
+    Lc = geometry.compute_connection_laplacian(data, R)
+
+    for Lc_ in [None, Lc]:
+        expected = Diffusion(tau0=1.0)(data.x, L, Lc=Lc_, method="spectral")
+        out = Diffusion(tau0=1.0, bf16=True)(data.x, L, Lc=Lc_, method="spectral")
+        assert out.dtype == expected.dtype
+        np.testing.assert_allclose(out.detach().numpy(), expected.detach().numpy(), atol=5e-2)